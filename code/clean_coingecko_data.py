@@ -6,47 +6,122 @@ Clean Coingecko Ranking Data
 This script cleans the coingecko_ranking.csv dataset by:
 1. Dropping rows with missing data
 2. Filtering to include only data from the last 6 years (since Feb 19, 2020)
-3. Saving the cleaned data to the processed data directory
+3. Saving the cleaned data to the processed data directory as Parquet
+
+The input is streamed in chunks so peak memory stays at one chunk rather
+than the full dataset. Each cleaned chunk is appended to the output as a
+Parquet row group.
 """
 
+import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
 from config_paths import RAW_DATA_DIR, PROCESSED_DATA_DIR
 
+# Rows per chunk when streaming the raw CSV
+CHUNK_SIZE = 200_000
+
+# Keep data from Feb 19, 2020 onwards (last 6 years)
+CUTOFF_DATE = np.datetime64('2020-02-19')
+
+# Timestamp layout of snapped_at in the raw CSV, e.g. '2020-02-19 00:00:00 UTC'
+SNAPPED_AT_FORMAT = '%Y-%m-%d %H:%M:%S UTC'
+
+# Column dtypes: the coin metadata columns repeat once per coin, so store
+# them as categoricals instead of one string object per row; coin_rank is
+# the nullable Int32 so a blank rank is kept as missing rather than aborting
+COLUMN_DTYPES = {
+    'coin_rank': 'Int32',
+    'coin_id': 'category',
+    'coin_name': 'category',
+    'coin_symbol': 'category',
+    'source_file': 'category',
+}
+
+# Output schema, fixed up front so every chunk is written with the same
+# column types regardless of which coins it happens to contain
+PARQUET_SCHEMA = pa.schema([
+    ('coin_rank', pa.int32()),
+    ('coin_id', pa.dictionary(pa.int32(), pa.string())),
+    ('coin_name', pa.dictionary(pa.int32(), pa.string())),
+    ('coin_symbol', pa.dictionary(pa.int32(), pa.string())),
+    ('source_file', pa.dictionary(pa.int32(), pa.string())),
+    ('snapped_at', pa.timestamp('ns')),
+    ('price', pa.float64()),
+    ('market_cap', pa.float64()),
+    ('total_volume', pa.float64()),
+])
+
 def clean_coingecko_data():
     # Input file
     input_file = RAW_DATA_DIR / 'coingecko_ranking.csv'
     
     # Output file
-    output_file = PROCESSED_DATA_DIR / 'coingecko_ranking_cleaned.csv'
-    
-    # Read the CSV
-    print("Reading data...")
-    df = pd.read_csv(input_file)
-    
-    # Check initial shape
-    print(f"Initial dataset shape: {df.shape}")
-    
-    
-    # Drop rows with any missing values (treating empty strings as missing)
-    print("Dropping rows with missing data...")
-    df_clean = df.dropna(subset=["price", "market_cap", "total_volume"])
+    output_file = PROCESSED_DATA_DIR / 'coingecko_ranking_cleaned.parquet'
     
-    print(f"After dropping missing data: {df_clean.shape}")
+    rows_read = 0
+    rows_complete = 0
+    rows_written = 0
+    n_cols = 0
     
-    # Convert snapped_at to datetime, removing ' UTC' if present
-    print("Converting dates...")
-    df_clean['snapped_at'] = pd.to_datetime(df_clean['snapped_at'].str.replace(' UTC', ''))
-    
-    # Filter to last 6 years: from Feb 19, 2020 onwards
-    cutoff_date = pd.Timestamp('2020-02-19')
-    df_filtered = df_clean[df_clean['snapped_at'] >= cutoff_date]
-    
-    print(f"After filtering to last 6 years: {df_filtered.shape}")
+    # Stream the CSV chunk by chunk, appending each cleaned chunk to the output.
+    # snapped_at is parsed by the C reader with a fixed format. Chunks go to a
+    # temporary file that replaces the output only once every chunk is written,
+    # so a failure never leaves a truncated Parquet file behind.
+    print("Reading data...")
+    tmp_file = output_file.with_name(output_file.name + '.tmp')
+    try:
+        with pq.ParquetWriter(tmp_file, PARQUET_SCHEMA, compression='snappy') as writer:
+            chunks = pd.read_csv(
+                input_file,
+                chunksize=CHUNK_SIZE,
+                dtype=COLUMN_DTYPES,
+                parse_dates=['snapped_at'],
+                date_format=SNAPPED_AT_FORMAT,
+            )
+            for chunk in chunks:
+                rows_read += len(chunk)
+                n_cols = chunk.shape[1]
+                
+                # Keep rows with no missing values (treating empty strings as missing)
+                # that fall on or after the cutoff; one mask, one selection
+                complete = chunk[["price", "market_cap", "total_volume"]].notna().all(axis=1)
+                
+                # Compare the raw int64 view of snapped_at against the cutoff in the
+                # column's own unit (NaT is the int64 minimum, so it is dropped)
+                snapped_at = chunk['snapped_at'].to_numpy()
+                if snapped_at.dtype.kind != 'M':
+                    # read_csv leaves the column as text if any value misses the format
+                    parsed = pd.to_datetime(
+                        chunk['snapped_at'], format=SNAPPED_AT_FORMAT, errors='coerce'
+                    )
+                    bad = chunk['snapped_at'][parsed.isna() & chunk['snapped_at'].notna()]
+                    example = f" (e.g. {bad.iloc[0]!r})" if len(bad) else ""
+                    raise ValueError(
+                        f"snapped_at values do not match the expected format "
+                        f"{SNAPPED_AT_FORMAT!r}{example}"
+                    )
+                cutoff = CUTOFF_DATE.astype(snapped_at.dtype).view('i8')
+                mask = complete & (snapped_at.view('i8') >= cutoff)
+                rows_complete += int(complete.sum())
+                rows_written += int(mask.sum())
+                
+                if mask.any():
+                    table = pa.Table.from_pandas(
+                        chunk.loc[mask], schema=PARQUET_SCHEMA, preserve_index=False
+                    )
+                    writer.write_table(table)
+        os.replace(tmp_file, output_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
     
-    # Save to processed directory
-    print(f"Saving cleaned data to {output_file}...")
-    df_filtered.to_csv(output_file, index=False)
+    print(f"Initial dataset shape: {(rows_read, n_cols)}")
+    print(f"After dropping missing data: {(rows_complete, n_cols)}")
+    print(f"After filtering to last 6 years: {(rows_written, n_cols)}")
+    print(f"Saved cleaned data to {output_file}")
     
     print("Cleaning complete!")
 
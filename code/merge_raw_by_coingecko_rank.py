@@ -1,21 +1,55 @@
 #!/usr/bin/env python3
 import csv
 import json
+import os
 import re
+import sys
 import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from html import unescape
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Union
 from urllib.error import HTTPError, URLError
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
 
 ROOT = Path(__file__).resolve().parents[1]
 RAW_DIR = ROOT / "data" / "raw"
 OUTPUT_FILE = ROOT / "data" / "raw" / "raw_merged_coingecko_ranked.csv"
+CACHE_FILE = RAW_DIR / "symbol_to_coin.json"
+CACHE_TTL_SECONDS = 24 * 60 * 60
 API_URL = "https://api.coingecko.com/api/v3/coins/markets"
 WEB_URL = "https://www.coingecko.com/en"
+COIN_META_COLUMNS = ["coin_id", "coin_name", "coin_symbol", "coin_rank"]
+UNMATCHED_RANK = 999999
+API_MAX_WORKERS = 8
+
+# coin_id, coin_name, coin_symbol (str) and coin_rank (int) for one coin.
+CoinMeta = Dict[str, Union[str, int]]
+
+# Ranking-page patterns, compiled once. The markup they match is plain ASCII.
+_ROW_RE = re.compile(r"<tr[^>]*>(.*?)</tr>", re.DOTALL | re.IGNORECASE | re.ASCII)
+_RANK_RE = re.compile(
+    r'<td class="tw-sticky tw-left-\[34px\] gecko-sticky">\s*(\d+)\s*</td>',
+    re.IGNORECASE | re.ASCII,
+)
+_SYMBOL_RE = re.compile(r'alt="([A-Za-z0-9_\.-]+)"', re.IGNORECASE | re.ASCII)
+_SYMBOL_TEXT_RE = re.compile(r"[A-Za-z0-9_\.-]+", re.ASCII)
+_NAME_RE = re.compile(
+    r'tw-text-gray-700 dark:tw-text-moon-100 tw-font-semibold tw-text-sm tw-leading-5">\s*([^<\n][^<]*?)\s*<',
+    re.IGNORECASE | re.ASCII,
+)
 
 
 def _request_text(url: str, timeout: int = 30) -> str:
@@ -32,9 +66,24 @@ def _request_text(url: str, timeout: int = 30) -> str:
         return response.read().decode("utf-8", errors="ignore")
 
 
-def fetch_ranked_symbols(max_pages: int = 10, per_page: int = 250) -> Dict[str, Dict[str, str]]:
-    symbol_to_coin: Dict[str, Dict[str, str]] = {}
-
+def _fetch_api_page(url: str) -> List[Dict[str, object]]:
+    for attempt in range(3):
+        try:
+            return json.loads(_request_text(url, timeout=30))
+        except HTTPError as exc:
+            # Only rate limiting and server errors are worth retrying.
+            if attempt == 2 or (exc.code != 429 and exc.code < 500):
+                raise
+        except (URLError, TimeoutError):
+            if attempt == 2:
+                raise
+        time.sleep(1.5 * 2**attempt)
+    return []
+
+
+def fetch_ranked_symbols(max_pages: int = 10, per_page: int = 250) -> Dict[str, CoinMeta]:
+    symbol_to_coin: Dict[str, CoinMeta] = {}
+    urls: List[str] = []
     for page in range(1, max_pages + 1):
         params = {
             "vs_currency": "usd",
@@ -43,53 +92,88 @@ def fetch_ranked_symbols(max_pages: int = 10, per_page: int = 250) -> Dict[str,
             "page": page,
             "sparkline": "false",
         }
-        url = f"{API_URL}?{urlencode(params)}"
+        urls.append(f"{API_URL}?{urlencode(params)}")
 
-        payload = None
-        for attempt in range(3):
-            try:
-                payload = _request_text(url, timeout=30)
+    # Pages are independent, so request them concurrently; map() still yields
+    # them in page order, and iteration stops at the first empty page.
+    with ThreadPoolExecutor(max_workers=min(API_MAX_WORKERS, max_pages)) as executor:
+        for data in executor.map(_fetch_api_page, urls):
+            if not data:
                 break
-            except (HTTPError, URLError, TimeoutError):
-                if attempt == 2:
-                    raise
-                time.sleep(1.5 * (attempt + 1))
 
-        data = json.loads(payload)
-        if not data:
-            break
-
-        for row in data:
-            symbol = str(row.get("symbol", "")).lower().strip()
-            if not symbol or symbol in symbol_to_coin:
-                continue
+            for row in data:
+                symbol = sys.intern(str(row.get("symbol", "")).lower().strip())
+                if not symbol or symbol in symbol_to_coin:
+                    continue
 
-            rank = row.get("market_cap_rank")
-            if rank is None:
-                continue
+                rank = row.get("market_cap_rank")
+                if rank is None:
+                    continue
 
-            symbol_to_coin[symbol] = {
-                "coin_id": str(row.get("id", "")),
-                "coin_name": str(row.get("name", "")),
-                "coin_symbol": symbol,
-                "coin_rank": str(rank),
-            }
+                symbol_to_coin[symbol] = {
+                    "coin_id": str(row.get("id", "")),
+                    "coin_name": str(row.get("name", "")),
+                    "coin_symbol": symbol,
+                    "coin_rank": int(rank),
+                }
 
     return symbol_to_coin
 
 
-def fetch_ranked_symbols_from_web(max_pages: int = 10) -> Dict[str, Dict[str, str]]:
-    symbol_to_coin: Dict[str, Dict[str, str]] = {}
-    row_pattern = re.compile(r"<tr[^>]*>(.*?)</tr>", re.DOTALL | re.IGNORECASE)
-    rank_pattern = re.compile(
-        r'<td class="tw-sticky tw-left-\[34px\] gecko-sticky">\s*(\d+)\s*</td>',
-        re.IGNORECASE,
-    )
-    symbol_pattern = re.compile(r'alt="([A-Za-z0-9_\.-]+)"', re.IGNORECASE)
-    name_pattern = re.compile(
-        r'tw-text-gray-700 dark:tw-text-moon-100 tw-font-semibold tw-text-sm tw-leading-5">\s*([^<\n][^<]*?)\s*<',
-        re.IGNORECASE,
-    )
+# (rank, symbol, name) for a ranking table row, or None if the row is not a coin row.
+RankedRow = Optional[Tuple[str, str, str]]
+
+
+def _parse_ranked_rows_dom(html: str) -> List[RankedRow]:
+    rows: List[RankedRow] = []
+
+    for tr in HTMLParser(html).css("tr"):
+        rank = ""
+        for td in tr.css("td.gecko-sticky"):
+            text = td.text(strip=True)
+            if text.isdigit():
+                rank = text
+                break
+
+        symbol = ""
+        for node in tr.css("[alt]"):
+            alt = node.attributes.get("alt") or ""
+            if _SYMBOL_TEXT_RE.fullmatch(alt):
+                symbol = alt
+                break
+
+        if not rank or not symbol:
+            rows.append(None)
+            continue
+
+        name_node = tr.css_first(".tw-text-gray-700.tw-font-semibold")
+        name = name_node.text(deep=False, strip=True) if name_node else ""
+        rows.append((rank, symbol, name))
+
+    return rows
+
+
+def _parse_ranked_rows_regex(html: str) -> List[RankedRow]:
+    rows: List[RankedRow] = []
+
+    for row_html in _ROW_RE.findall(html):
+        rank_match = _RANK_RE.search(row_html)
+        symbol_match = _SYMBOL_RE.search(row_html)
+        if not rank_match or not symbol_match:
+            rows.append(None)
+            continue
+
+        name_match = _NAME_RE.search(row_html)
+        name = unescape(name_match.group(1).strip()) if name_match else ""
+        rows.append((rank_match.group(1), symbol_match.group(1), name))
+
+    return rows
+
+
+def fetch_ranked_symbols_from_web(max_pages: int = 10) -> Dict[str, CoinMeta]:
+    symbol_to_coin: Dict[str, CoinMeta] = {}
+    # Walk the DOM once with selectolax when available; regex is the fallback.
+    parse_rows = _parse_ranked_rows_dom if HTMLParser is not None else _parse_ranked_rows_regex
 
     for page in range(1, max_pages + 1):
         url = f"{WEB_URL}?page={page}"
@@ -98,30 +182,25 @@ def fetch_ranked_symbols_from_web(max_pages: int = 10) -> Dict[str, Dict[str, st
         except (HTTPError, URLError, TimeoutError):
             continue
 
-        rows = row_pattern.findall(html)
+        rows = parse_rows(html)
         if not rows:
             continue
 
         page_added = 0
-        for row_html in rows:
-            rank_match = rank_pattern.search(row_html)
-            symbol_match = symbol_pattern.search(row_html)
-            if not rank_match or not symbol_match:
+        for parsed in rows:
+            if parsed is None:
                 continue
 
-            symbol = symbol_match.group(1).lower().strip()
+            rank, symbol, name = parsed
+            symbol = sys.intern(symbol.lower().strip())
             if not symbol or symbol in symbol_to_coin:
                 continue
 
-            rank = rank_match.group(1)
-            name_match = name_pattern.search(row_html)
-            name = unescape(name_match.group(1).strip()) if name_match else ""
-
             symbol_to_coin[symbol] = {
                 "coin_id": "",
                 "coin_name": name,
                 "coin_symbol": symbol,
-                "coin_rank": rank,
+                "coin_rank": int(rank),
             }
             page_added += 1
 
@@ -131,6 +210,40 @@ def fetch_ranked_symbols_from_web(max_pages: int = 10) -> Dict[str, Dict[str, st
     return symbol_to_coin
 
 
+def load_cached_ranking(cache_file: Path) -> Optional[Dict[str, CoinMeta]]:
+    try:
+        with cache_file.open("r", encoding="utf-8") as handle:
+            cached = json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(cached, dict):
+        return None
+    fetched_at = cached.get("fetched_at")
+    if not isinstance(fetched_at, (int, float)):
+        return None
+    # A timestamp in the future (clock change, hand-edited file) is not fresh.
+    if not 0 <= time.time() - fetched_at < CACHE_TTL_SECONDS:
+        return None
+    data = cached.get("data")
+    if not isinstance(data, dict):
+        return None
+    return data or None
+
+
+def save_cached_ranking(cache_file: Path, symbol_to_coin: Dict[str, CoinMeta]) -> None:
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    # Write beside the target and swap it in, so an interrupted run never
+    # leaves a truncated cache behind.
+    tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+    try:
+        with tmp_file.open("w", encoding="utf-8") as handle:
+            json.dump({"fetched_at": time.time(), "data": symbol_to_coin}, handle)
+        os.replace(tmp_file, cache_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+
 def list_input_files(raw_dir: Path) -> List[Path]:
     return sorted(raw_dir.glob("*-usd-max.csv"), key=lambda p: p.name.lower())
 
@@ -139,51 +252,156 @@ def parse_symbol_from_filename(path: Path) -> str:
     return path.name[: -len("-usd-max.csv")].lower()
 
 
+def read_header(path: Path) -> List[str]:
+    # utf-8-sig drops a leading byte order mark, as the CSV parsers do.
+    with path.open("r", newline="", encoding="utf-8-sig") as handle:
+        return next(csv.reader(handle), [])
+
+
+def _load_file(
+    path: Path,
+    coin_meta: CoinMeta,
+    base_headers: List[str],
+    output_headers: List[str],
+) -> pd.DataFrame:
+    # Parse only the base columns this file has, and as text so values are
+    # written back exactly as found; absent ones become "".
+    header = read_header(path)
+    if not header:
+        # A zero-byte file contributes no rows, as with csv.DictReader.
+        return pd.DataFrame(columns=output_headers)
+    # Select by position; a repeated name keeps its last column, as the
+    # dict rows of csv.DictReader did.
+    positions = {name: i for i, name in enumerate(header) if name in base_headers}
+    indices = sorted(positions.values())
+    names = {i: name for name, i in positions.items()}
+    missing = {name: "" for name in base_headers if name not in positions}
+    try:
+        # Memory-mapped read through Arrow's multithreaded tokenizer. The
+        # header row is skipped and columns are named by position, so the
+        # selection matches the C parser's below.
+        columns = [str(i) for i in range(len(header))]
+        with pa.memory_map(str(path)) as source:
+            table = pa_csv.read_csv(
+                source,
+                read_options=pa_csv.ReadOptions(
+                    use_threads=True, column_names=columns, skip_rows=1
+                ),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=[columns[i] for i in indices],
+                    column_types={columns[i]: pa.string() for i in indices},
+                    strings_can_be_null=False,
+                ),
+            )
+        table = table.rename_columns([names[i] for i in indices])
+        frame = table.to_pandas(types_mapper=pd.ArrowDtype)
+    except (pa.ArrowInvalid, pa.ArrowKeyError):
+        # Arrow rejects ragged rows; the C parser pads them, as csv did before.
+        frame = pd.read_csv(
+            path,
+            dtype=str,
+            keep_default_na=False,
+            header=0,
+            names=range(len(header)),
+            usecols=indices,
+            index_col=False,
+        ).rename(columns=names)
+    if missing:
+        frame = frame.assign(**missing)
+    # CoinGecko exports are already in snapped_at order; only sort a file that is not.
+    if "snapped_at" in frame and not frame["snapped_at"].is_monotonic_increasing:
+        frame.sort_values("snapped_at", kind="stable", inplace=True)
+    return frame.assign(**coin_meta, source_file=path.name)[output_headers]
+
+
+def _iter_frames(
+    file_table: pd.DataFrame,
+    base_headers: List[str],
+    output_headers: List[str],
+) -> Iterator[pd.DataFrame]:
+    metas = file_table[COIN_META_COLUMNS].to_dict("records")
+    workers = os.cpu_count() or 1
+
+    # Keep only a small window of files in flight so finished frames never
+    # pile up ahead of the writer; peak memory is a few files, not all of them.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Deque[Future] = deque()
+        for path, coin_meta in zip(file_table["path"], metas):
+            pending.append(
+                executor.submit(_load_file, path, coin_meta, base_headers, output_headers)
+            )
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _iter_symbol_frames(
+    file_table: pd.DataFrame,
+    base_headers: List[str],
+    output_headers: List[str],
+) -> Iterator[pd.DataFrame]:
+    # file_table is sorted by symbol within rank, so files sharing a symbol
+    # (names differing only in case) arrive together; their rows are merged
+    # by snapped_at before being emitted as one block.
+    group: List[pd.DataFrame] = []
+    group_symbol = None
+    frames = _iter_frames(file_table, base_headers, output_headers)
+    for symbol, frame in zip(file_table["coin_symbol"], frames):
+        if group and symbol != group_symbol:
+            yield _merge_group(group)
+            group = []
+        group_symbol = symbol
+        group.append(frame)
+    if group:
+        yield _merge_group(group)
+
+
+def _merge_group(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    if len(frames) == 1:
+        return frames[0]
+    merged = pd.concat(frames, ignore_index=True)
+    if "snapped_at" in merged:
+        merged.sort_values("snapped_at", kind="stable", inplace=True)
+    return merged
+
+
 def build_merged_rows(
     files: List[Path],
-    symbol_to_coin: Dict[str, Dict[str, str]],
-) -> Tuple[List[str], List[Dict[str, str]], List[str]]:
-    all_rows: List[Dict[str, str]] = []
-    unmatched_files: List[str] = []
-    base_headers: List[str] = []
-
-    for file_path in files:
-        symbol = parse_symbol_from_filename(file_path)
-        coin_meta = symbol_to_coin.get(symbol)
-
-        if coin_meta is None:
-            unmatched_files.append(file_path.name)
-            coin_meta = {
-                "coin_id": "",
-                "coin_name": "",
-                "coin_symbol": symbol,
-                "coin_rank": "999999",
-            }
-
-        with file_path.open("r", newline="", encoding="utf-8") as handle:
-            reader = csv.DictReader(handle)
-            if not base_headers:
-                base_headers = list(reader.fieldnames or [])
-
-            for row in reader:
-                merged = {
-                    "coin_rank": coin_meta["coin_rank"],
-                    "coin_id": coin_meta["coin_id"],
-                    "coin_name": coin_meta["coin_name"],
-                    "coin_symbol": coin_meta["coin_symbol"],
-                    "source_file": file_path.name,
-                    **{k: row.get(k, "") for k in base_headers},
-                }
-                all_rows.append(merged)
-
-    all_rows.sort(
-        key=lambda item: (
-            int(item["coin_rank"]),
-            item["coin_symbol"],
-            item.get("snapped_at", ""),
-        )
+    symbol_to_coin: Dict[str, CoinMeta],
+) -> Tuple[List[str], Iterator[pd.DataFrame], List[str]]:
+    # One row per input file, joined column-wise against the ranking table.
+    file_table = pd.DataFrame(
+        {"coin_symbol": [parse_symbol_from_filename(path) for path in files], "path": files}
     )
+    # Hash-join on the ranks table's symbol index; each symbol has at most one
+    # ranking, so any row multiplication is an error rather than silent.
+    ranks_df = pd.DataFrame.from_dict(
+        symbol_to_coin, orient="index", columns=["coin_id", "coin_name", "coin_rank"]
+    )
+    file_table = file_table.merge(
+        ranks_df,
+        left_on="coin_symbol",
+        right_index=True,
+        how="left",
+        validate="many_to_one",
+        sort=False,
+    )
+
+    unmatched_files = [path.name for path in file_table.loc[file_table["coin_rank"].isna(), "path"]]
+    file_table = file_table.fillna({"coin_rank": UNMATCHED_RANK, "coin_id": "", "coin_name": ""})
+    # Ranks are ints from the fetchers; the cast only settles the column dtype
+    # (and covers a cache written before ranks were stored as ints).
+    file_table["coin_rank"] = file_table["coin_rank"].astype("int64")
 
+    # Rank is constant for a symbol, so ordering the files by (rank, symbol)
+    # and emitting each symbol's rows in turn yields the globally sorted
+    # output without holding every row in memory. Most symbols have a single
+    # file; the few that have several are merged by _iter_symbol_frames.
+    file_table.sort_values(["coin_rank", "coin_symbol"], kind="stable", inplace=True)
+
+    # Take the columns from the first file that has a header; empty files are skipped.
+    base_headers = next((header for header in map(read_header, files) if header), [])
     output_headers = [
         "coin_rank",
         "coin_id",
@@ -192,7 +410,11 @@ def build_merged_rows(
         "source_file",
         *base_headers,
     ]
-    return output_headers, all_rows, unmatched_files
+    return (
+        output_headers,
+        _iter_symbol_frames(file_table, base_headers, output_headers),
+        unmatched_files,
+    )
 
 
 def main() -> None:
@@ -200,25 +422,39 @@ def main() -> None:
     if not input_files:
         raise FileNotFoundError(f"No '*-usd-max.csv' files found in {RAW_DIR}")
 
-    try:
-        symbol_to_coin = fetch_ranked_symbols()
-    except (HTTPError, URLError, TimeoutError):
-        symbol_to_coin = fetch_ranked_symbols_from_web()
+    symbol_to_coin = load_cached_ranking(CACHE_FILE)
+    if symbol_to_coin is not None:
+        print(f"Using cached CoinGecko ranking: {CACHE_FILE}")
+    else:
+        try:
+            symbol_to_coin = fetch_ranked_symbols()
+        except (HTTPError, URLError, TimeoutError):
+            symbol_to_coin = fetch_ranked_symbols_from_web()
 
-    if not symbol_to_coin:
-        raise RuntimeError("Unable to fetch CoinGecko ranking from API or website.")
+        if not symbol_to_coin:
+            raise RuntimeError("Unable to fetch CoinGecko ranking from API or website.")
+        save_cached_ranking(CACHE_FILE, symbol_to_coin)
 
-    headers, merged_rows, unmatched = build_merged_rows(input_files, symbol_to_coin)
+    headers, frames, unmatched = build_merged_rows(input_files, symbol_to_coin)
 
+    # Stream into a temporary file next to the output and swap it in only once
+    # every frame is written, so a failure never leaves a truncated merge.
+    rows_written = 0
     OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with OUTPUT_FILE.open("w", newline="", encoding="utf-8") as handle:
-        writer = csv.DictWriter(handle, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(merged_rows)
+    tmp_file = OUTPUT_FILE.with_name(OUTPUT_FILE.name + ".tmp")
+    try:
+        with tmp_file.open("w", newline="", encoding="utf-8") as handle:
+            csv.writer(handle).writerow(headers)
+            for frame in frames:
+                frame.to_csv(handle, header=False, index=False, lineterminator="\r\n")
+                rows_written += len(frame)
+        os.replace(tmp_file, OUTPUT_FILE)
+    finally:
+        tmp_file.unlink(missing_ok=True)
 
     print(f"Wrote merged file: {OUTPUT_FILE}")
     print(f"Input files merged: {len(input_files)}")
-    print(f"Rows written: {len(merged_rows)}")
+    print(f"Rows written: {rows_written}")
     if unmatched:
         print("Files not matched to CoinGecko symbols (placed last):")
         for name in unmatched:
@@ -0,0 +1,28 @@
+import pandas as pd
+
+import clean_coingecko_data as clean
+
+HEADER = "coin_rank,coin_id,coin_name,coin_symbol,source_file,snapped_at,price,market_cap,total_volume\n"
+
+
+def run_clean(tmp_path, monkeypatch, rows):
+    (tmp_path / "coingecko_ranking.csv").write_text(HEADER + "".join(rows), encoding="utf-8")
+    monkeypatch.setattr(clean, "RAW_DATA_DIR", tmp_path)
+    monkeypatch.setattr(clean, "PROCESSED_DATA_DIR", tmp_path)
+    clean.clean_coingecko_data()
+    return pd.read_parquet(tmp_path / "coingecko_ranking_cleaned.parquet")
+
+
+def test_blank_rank_is_kept_as_missing(tmp_path, monkeypatch):
+    cleaned = run_clean(
+        tmp_path,
+        monkeypatch,
+        [
+            "1,bitcoin,Bitcoin,btc,btc-usd-max.csv,2021-01-01 00:00:00 UTC,1.5,2.5,3.5\n",
+            ",,,zzz,zzz-usd-max.csv,2021-01-01 00:00:00 UTC,1.0,2.0,3.0\n",
+            "1,bitcoin,Bitcoin,btc,btc-usd-max.csv,2019-01-01 00:00:00 UTC,1.0,2.0,3.0\n",
+        ],
+    )
+    assert cleaned["coin_symbol"].tolist() == ["btc", "zzz"]
+    assert cleaned["coin_rank"].iloc[0] == 1
+    assert pd.isna(cleaned["coin_rank"].iloc[1])
@@ -0,0 +1,133 @@
+import json
+import time
+
+import pandas as pd
+import pytest
+
+import merge_raw_by_coingecko_rank as merge
+
+RANKING = {"btc": {"coin_id": "bitcoin", "coin_name": "Bitcoin", "coin_rank": 1}}
+HEADER = "snapped_at,price,market_cap,total_volume\n"
+
+
+def write_cache(path, payload):
+    path.write_text(json.dumps(payload), encoding="utf-8")
+    return path
+
+
+def merge_dir(raw_dir, symbol_to_coin=RANKING):
+    files = merge.list_input_files(raw_dir)
+    headers, frames, unmatched = merge.build_merged_rows(files, symbol_to_coin)
+    merged = pd.concat(list(frames), ignore_index=True)
+    return headers, merged.astype(str), unmatched
+
+
+def test_files_sharing_a_symbol_are_merged_by_date(tmp_path):
+    (tmp_path / "btc-usd-max.csv").write_text(
+        HEADER + "2020-01-01 00:00:00 UTC,1,2,3\n2020-01-03 00:00:00 UTC,5,6,7\n"
+    )
+    (tmp_path / "BTC-usd-max.csv").write_text(
+        HEADER + "2020-01-02 00:00:00 UTC,10,20,30\n2020-01-03 00:00:00 UTC,50,60,70\n"
+    )
+    _, merged, _ = merge_dir(tmp_path)
+    assert merged["snapped_at"].str[:10].tolist() == [
+        "2020-01-01",
+        "2020-01-02",
+        "2020-01-03",
+        "2020-01-03",
+    ]
+    # Equal dates keep the input file order.
+    assert merged["price"].tolist() == ["1", "10", "50", "5"]
+
+
+def test_header_byte_order_mark_is_ignored(tmp_path):
+    (tmp_path / "btc-usd-max.csv").write_text(
+        HEADER + "2020-01-01 00:00:00 UTC,1,2,3\n", encoding="utf-8-sig"
+    )
+    headers, merged, _ = merge_dir(tmp_path)
+    assert headers[5:] == ["snapped_at", "price", "market_cap", "total_volume"]
+    assert merged["snapped_at"].tolist() == ["2020-01-01 00:00:00 UTC"]
+
+
+def test_repeated_header_keeps_last_column_in_ragged_file(tmp_path):
+    (tmp_path / "aaa-usd-max.csv").write_text(HEADER + "2020-01-01 00:00:00 UTC,1,2,3\n")
+    (tmp_path / "btc-usd-max.csv").write_text(
+        "snapped_at,price,price,market_cap,total_volume\n"
+        "2020-01-01 00:00:00 UTC,1,1.5,2,3,extra\n"
+        "2020-01-02 00:00:00 UTC,4\n"
+    )
+    _, merged, _ = merge_dir(tmp_path)
+    btc = merged[merged["coin_symbol"] == "btc"]
+    assert btc[["price", "market_cap", "total_volume"]].values.tolist() == [
+        ["1.5", "2", "3"],
+        ["", "", ""],
+    ]
+
+
+def test_repeated_header_keeps_last_column(tmp_path):
+    (tmp_path / "btc-usd-max.csv").write_text(
+        "snapped_at,price,price,market_cap,total_volume\n"
+        "2020-01-01 00:00:00 UTC,1,1.5,2,3\n"
+    )
+    headers, merged, _ = merge_dir(tmp_path)
+    assert headers[5:] == ["snapped_at", "price", "price", "market_cap", "total_volume"]
+    assert merged.columns.tolist() == headers
+    assert merged.iloc[0, 5:].tolist() == ["2020-01-01 00:00:00 UTC", "1.5", "1.5", "2", "3"]
+
+
+def test_cache_round_trip(tmp_path):
+    cache_file = tmp_path / "cache.json"
+    merge.save_cached_ranking(cache_file, RANKING)
+    assert merge.load_cached_ranking(cache_file) == RANKING
+    assert list(tmp_path.iterdir()) == [cache_file]
+
+
+@pytest.mark.parametrize(
+    "age",
+    [
+        merge.CACHE_TTL_SECONDS,  # expired exactly at the TTL
+        merge.CACHE_TTL_SECONDS * 2,
+        -60,  # fetched_at in the future
+    ],
+)
+def test_cache_outside_ttl_is_ignored(tmp_path, age):
+    cache_file = write_cache(
+        tmp_path / "cache.json", {"fetched_at": time.time() - age, "data": RANKING}
+    )
+    assert merge.load_cached_ranking(cache_file) is None
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        [1, 2],
+        {"data": RANKING},
+        {"fetched_at": "yesterday", "data": RANKING},
+        {"fetched_at": time.time(), "data": [1, 2]},
+        {"fetched_at": time.time(), "data": {}},
+    ],
+)
+def test_malformed_cache_is_ignored(tmp_path, payload):
+    cache_file = write_cache(tmp_path / "cache.json", payload)
+    assert merge.load_cached_ranking(cache_file) is None
+
+
+def test_missing_or_corrupt_cache_is_ignored(tmp_path):
+    assert merge.load_cached_ranking(tmp_path / "absent.json") is None
+    corrupt = tmp_path / "cache.json"
+    corrupt.write_text('{"fetched_at": 1', encoding="utf-8")
+    assert merge.load_cached_ranking(corrupt) is None
+
+
+def test_failed_save_keeps_previous_cache(tmp_path, monkeypatch):
+    cache_file = write_cache(tmp_path / "cache.json", {"fetched_at": time.time(), "data": RANKING})
+    before = cache_file.read_bytes()
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(merge.json, "dump", fail)
+    with pytest.raises(OSError):
+        merge.save_cached_ranking(cache_file, {"eth": RANKING["btc"]})
+    assert cache_file.read_bytes() == before
+    assert list(tmp_path.iterdir()) == [cache_file]